@@ -0,0 +1,110 @@
+"""Synthetic bank statements in the same shape as unfiltered_accounts/*.csv.
+
+Rows are headerless "date,activity,expense,income,total" lines with the
+padded, suffixed descriptors the bank exports use, e.g.
+
+    01/02/2024,UBER CANADA/UBE   _V,12.40,,28.84
+    01/02/2024,E-TRANSFER ***cZN   ,,12.00,41.24
+
+Usage:
+    python benchmarks/generate_statements.py --rows 100000 --merchants 500 > big.csv
+"""
+import argparse
+import random
+import string
+import sys
+from datetime import date, timedelta
+
+SUFFIXES = ["_M", "_V", "_F", "_T", "  "]
+
+# Roughly one row in eight is incoming money, like the real exports
+INCOME_SHARE = 0.125
+
+
+def merchant_names(count, seed=0):
+    """Return count distinct descriptors padded the way the bank pads them."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        word = "".join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(3, 9)))
+        store = rng.choice(["", f" #{rng.randint(1, 999)}", f" {rng.randint(100, 9999)}"])
+        names.add(f"{word}{store}"[:15].ljust(18) + rng.choice(SUFFIXES))
+    return sorted(names)
+
+
+def income_names(count, seed=0):
+    rng = random.Random(seed + 1)
+    names = set()
+    while len(names) < count:
+        code = "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(3))
+        names.add(f"E-TRANSFER ***{code}   ")
+    return sorted(names)
+
+
+def generate_rows(rows, merchants=200, seed=0, start=date(2024, 1, 1), months=12):
+    """Yield CSV lines for a statement of the given length.
+
+    Transactions are spread evenly over the given number of months, so a
+    bigger statement means busier days rather than a longer period.
+    """
+    rng = random.Random(seed)
+    expense_pool = merchant_names(merchants, seed)
+    income_pool = income_names(max(1, merchants // 8), seed)
+    span_days = months * 365 // 12
+    balance = 1000.0
+    for position in range(rows):
+        day = start + timedelta(days=position * span_days // rows)
+        if rng.random() < INCOME_SHARE:
+            amount = round(rng.uniform(10, 1500), 2)
+            balance += amount
+            yield f"{day:%m/%d/%Y},{rng.choice(income_pool)},,{amount:.2f},{balance:.2f}"
+        else:
+            amount = round(rng.uniform(1, 200), 2)
+            balance -= amount
+            yield f"{day:%m/%d/%Y},{rng.choice(expense_pool)},{amount:.2f},,{balance:.2f}"
+
+
+def generate_statement(rows, merchants=200, seed=0, start=date(2024, 1, 1), months=12):
+    return "\n".join(generate_rows(rows, merchants, seed, start, months)) + "\n"
+
+
+def generate_rules(merchants=200, rule_count=50, coverage=0.8, seed=0):
+    """Return (expense_data, income_data) in the classification file format.
+
+    coverage is the share of merchants that some rule matches; the rest
+    stay unclassified, as new merchants do in real uploads.
+    """
+    rng = random.Random(seed + 2)
+    expense_pool = merchant_names(merchants, seed)
+    income_pool = income_names(max(1, merchants // 8), seed)
+
+    expense_data = [
+        {"classification": f"{number:02d} - Category {number}", "expenses_attributed": []}
+        for number in range(1, rule_count + 1)
+    ]
+    for name in rng.sample(expense_pool, int(len(expense_pool) * coverage)):
+        rng.choice(expense_data)["expenses_attributed"].append(name)
+
+    income_data = [
+        {"classification": f"IN: {number:02d} - Income {number}", "income_attributed": []}
+        for number in range(1, max(2, rule_count // 10) + 1)
+    ]
+    for name in rng.sample(income_pool, int(len(income_pool) * coverage)):
+        rng.choice(income_data)["income_attributed"].append(name)
+
+    return expense_data, income_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--merchants", type=int, default=200)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for line in generate_rows(args.rows, args.merchants, args.seed, months=args.months):
+        sys.stdout.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
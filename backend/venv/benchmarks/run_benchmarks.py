@@ -0,0 +1,204 @@
+"""Time the backend's hot paths in-process and compare against a baseline.
+
+Every case goes through the FastAPI app with its TestClient (which needs
+httpx), inside a scratch directory holding synthetic rule files and its
+own database, so the real uploads and rules are never touched.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # compare with baseline.json
+    python benchmarks/run_benchmarks.py --rows 1000 100000 --save-baseline
+    python benchmarks/run_benchmarks.py --threshold 0.10     # flag >10% slowdowns
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from generate_statements import generate_rules, generate_statement  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# Differences smaller than these are treated as noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.002
+MIN_BYTES_DELTA = 1024 * 1024
+
+# Cases whose work grows with every row of the statement; only these get a
+# rows/s figure
+ROW_CASES = {"upload", "classify", "reclassify", "pivot-table", "fetch"}
+
+
+def _prepare_workspace(merchants, rule_count):
+    """Chdir into a scratch directory with synthetic rules, then import the app."""
+    workspace = tempfile.mkdtemp(prefix="easyaccounting-bench-")
+    os.chdir(workspace)
+    expense_data, income_data = generate_rules(merchants, rule_count)
+    with open("expense_classification.json", "w") as f:
+        json.dump(expense_data, f)
+    with open("income_classification.json", "w") as f:
+        json.dump(income_data, f)
+    os.environ["EASYACCOUNTING_DB"] = os.path.join(workspace, "bench.db")
+
+    import main
+    from fastapi.testclient import TestClient
+    return workspace, main, TestClient(main.app)
+
+
+def _measure(run, repeat, setup=None):
+    """Best wall time over repeat runs, and peak traced memory of one extra run.
+
+    setup runs before the clock and the memory tracing start, so neither
+    includes it.
+    """
+    def once(argument):
+        started = time.perf_counter()
+        run(argument)
+        return time.perf_counter() - started
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = min(once(setup() if setup else None) for _ in range(repeat))
+        argument = setup() if setup else None
+        tracemalloc.start()
+        try:
+            once(argument)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def run_cases(main, client, rows, merchants, repeat):
+    import pandas as pd
+    from ingestion_module import CSV_HEADERS
+
+    statement = generate_statement(rows, merchants).encode()
+
+    def upload(_=None):
+        response = client.post("/uploadcsv", files={"file": ("bench.csv", statement)})
+        return response.json()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        uploaded = upload()
+    file_id = uploaded["fileId"]
+    parsed = uploaded["parsed"]
+    unmatched = iter(sorted({row["activity"] for row in uploaded.get("rem_class", [])}))
+    folder_id = client.post("/create-folder", json={"folder_name": f"bench-{rows}-{time.time()}"}).json()["folderId"]
+    frame = pd.read_csv(io.BytesIO(statement), names=CSV_HEADERS).fillna(0)
+    pivot_rows = [[r["date"], r["activity"], r["expense"], r["income"], r["classification"]] for r in parsed]
+
+    def upload_for_delete():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return upload()["fileId"]
+
+    cases = {
+        "upload": (upload, None),
+        "classify": (lambda _: main.classify(frame.copy()), None),
+        "reclassify": (lambda _: client.post("/reclassify", json=parsed), None),
+        "addnewvalue": (
+            lambda activity: client.post(
+                "/addnewvalue", json={"classification": "01 - Category 1", "activity": activity}
+            ),
+            lambda: next(unmatched, "NO SUCH MERCHANT"),
+        ),
+        "pivot-table": (lambda _: client.post("/pivot-table", json=pivot_rows), None),
+        "pivot": (lambda _: client.get(f"/pivot?file_id={file_id}&period=month"), None),
+        "list": (lambda _: client.get("/stored-files"), None),
+        "fetch": (lambda _: client.get(f"/file-data/{file_id}"), None),
+        "search": (lambda _: client.get("/search?q=e-trans&min_amount=100"), None),
+        "move": (lambda _: client.post("/move-file", json={"file_id": file_id, "folder_id": folder_id}), None),
+        "delete": (lambda uploaded_id: client.delete(f"/file/{uploaded_id}"), upload_for_delete),
+    }
+
+    results = {}
+    for name, (run, setup) in cases.items():
+        seconds, peak = _measure(run, repeat, setup)
+        results[f"{name}@{rows}"] = {
+            "seconds": seconds,
+            "rowsPerSecond": rows / seconds if seconds and name in ROW_CASES else None,
+            "peakBytes": peak,
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable regressions against the baseline."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if (current["seconds"] > previous["seconds"] * (1 + threshold)
+                and current["seconds"] - previous["seconds"] > MIN_SECONDS_DELTA):
+            regressions.append(
+                f"{key}: {previous['seconds'] * 1000:.1f} ms -> {current['seconds'] * 1000:.1f} ms"
+            )
+        if (current["peakBytes"] > previous["peakBytes"] * (1 + threshold)
+                and current["peakBytes"] - previous["peakBytes"] > MIN_BYTES_DELTA):
+            regressions.append(
+                f"{key}: peak {previous['peakBytes'] / 1e6:.1f} MB -> {current['peakBytes'] / 1e6:.1f} MB"
+            )
+    return regressions
+
+
+def print_report(results, baseline):
+    print(f"{'case':<22}{'ms':>12}{'rows/s':>14}{'peak MB':>10}{'vs base':>10}")
+    for key, current in results.items():
+        previous = baseline.get(key)
+        change = f"{current['seconds'] / previous['seconds']:.2f}x" if previous else "-"
+        rate = f"{current['rowsPerSecond']:,.0f}" if current["rowsPerSecond"] else "-"
+        print(f"{key:<22}{current['seconds'] * 1000:>12.2f}{rate:>14}"
+              f"{current['peakBytes'] / 1e6:>10.1f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the EasyAccounting backend hot paths.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000],
+                        help="statement sizes to run (the generator handles 1k to 1M)")
+    parser.add_argument("--merchants", type=int, default=500, help="distinct merchants per statement")
+    parser.add_argument("--rules", type=int, default=50, help="expense categories in the rule files")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the best is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    # Resolved before the benchmark moves into its scratch directory
+    args.baseline = os.path.abspath(args.baseline)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+    _, app_module, client = _prepare_workspace(args.merchants, args.rules)
+    results = {}
+    for rows in args.rows:
+        results.update(run_cases(app_module, client, rows, args.merchants, args.repeat))
+
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
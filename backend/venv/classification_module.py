@@ -0,0 +1,261 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import re
+import threading
+
+from metrics_module import RULE_RELOADS, logger
+
+EXPENSE_RULES_FILE = "expense_classification.json"
+INCOME_RULES_FILE = "income_classification.json"
+
+# "exact" only matches a keyword equal to the whole activity. "prefix" also
+# accepts the longest keyword that starts the activity on a word boundary, so
+# descriptors like "METRO  247        _F" still match a "metro 247" keyword.
+MATCH_MODE = os.environ.get("CLASSIFY_MATCH_MODE", "exact")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_activity(activity):
+    """Lower-case an activity and collapse the padding banks put in it."""
+    return _WHITESPACE.sub(" ", str(activity)).strip().lower()
+
+
+class _KeywordTrie:
+    """Word-level trie of keywords, used for longest-prefix matching."""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, keyword, category):
+        node = self.root
+        for word in keyword.split(" "):
+            node = node.setdefault(word, {})
+        # None can never be a word, so it marks the end of a keyword
+        node[None] = category
+
+    def longest_prefix(self, activity):
+        node = self.root
+        found = None
+        for word in activity.split(" "):
+            node = node.get(word)
+            if node is None:
+                break
+            if None in node:
+                found = node[None]
+        return found
+
+
+class CompiledRules:
+    """Keyword lookups built once from the two classification files."""
+
+    def __init__(self, expense_data, income_data, version=None):
+        self.expense_data = expense_data
+        self.income_data = income_data
+        # Identifies the rule files this was compiled from, for cache validators
+        self.version = version
+        self.options = {
+            "expense": sorted(item["classification"] for item in expense_data),
+            "income": sorted(item["classification"] for item in income_data),
+        }
+        self.indexes = {
+            "expense": _build_index(expense_data, "expenses_attributed"),
+            "income": _build_index(income_data, "income_attributed"),
+        }
+        self.tries = {}
+        for kind, index in self.indexes.items():
+            trie = _KeywordTrie()
+            for keyword, category in index.items():
+                trie.add(keyword, category)
+            self.tries[kind] = trie
+
+    def match(self, kind, activity, mode=None):
+        """Return the category for a normalized activity, or None."""
+        category = self.indexes[kind].get(activity)
+        if category is None and (mode or MATCH_MODE) == "prefix":
+            category = self.tries[kind].longest_prefix(activity)
+        return category
+
+
+def _build_index(data, key):
+    # Later categories overwrite earlier ones on a shared keyword, which is
+    # the same winner the old per-row loop ended up with.
+    index = {}
+    for item in data:
+        for keyword in item[key]:
+            index[normalize_activity(keyword)] = item["classification"]
+    return index
+
+
+_rules_lock = threading.Lock()
+_rules_cache = {"stamp": None, "rules": None}
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_rules():
+    """Return the compiled rules, recompiling only if a rule file changed."""
+    stamp = (_file_stamp(EXPENSE_RULES_FILE), _file_stamp(INCOME_RULES_FILE))
+    with _rules_lock:
+        if _rules_cache["rules"] is None or _rules_cache["stamp"] != stamp:
+            with open(EXPENSE_RULES_FILE, "r") as f:
+                expense_data = json.load(f)
+            with open(INCOME_RULES_FILE, "r") as f:
+                income_data = json.load(f)
+            _rules_cache["rules"] = CompiledRules(expense_data, income_data, version=repr(stamp))
+            _rules_cache["stamp"] = stamp
+            RULE_RELOADS.inc()
+            logger.debug("compiled classification rules %s", stamp)
+        return _rules_cache["rules"]
+
+
+def _invalidate_rules():
+    with _rules_lock:
+        _rules_cache["rules"] = None
+
+
+def classify(df, match_mode=None, rules=None):
+    if rules is None:
+        rules = load_rules()
+
+    # Each distinct activity is normalized and looked up once, then the
+    # result is broadcast back to every row that shares it.
+    codes, uniques = pd.factorize(df["activity"].astype(str))
+    normalized = [normalize_activity(activity) for activity in uniques]
+    expense_hits = np.array([rules.match("expense", a, match_mode) for a in normalized], dtype=object)
+    income_hits = np.array([rules.match("income", a, match_mode) for a in normalized], dtype=object)
+
+    expense = pd.to_numeric(df["expense"], errors='coerce').fillna(0)
+    income = pd.to_numeric(df["income"], errors='coerce').fillna(0)
+    is_expense = expense > 0
+    # Income rules are only consulted for rows without an expense
+    is_income = ~is_expense & (income > 0)
+
+    matched = pd.Series(None, index=df.index, dtype=object)
+    matched[is_expense] = expense_hits[codes][is_expense.to_numpy()]
+    matched[is_income] = income_hits[codes][is_income.to_numpy()]
+
+    df["classification"] = matched.fillna("No classification")
+
+    unmatched = df[(is_expense | is_income) & matched.isna()]
+    remaining_classifications = [
+        dict(row, idx=idx)
+        for idx, row in zip(unmatched.index, unmatched.to_dict(orient="records"))
+    ]
+
+    df["expense"] = expense
+    df["income"] = income
+    df = df.sort_values(by="classification")
+    logger.debug("%d of %d rows left unclassified", len(remaining_classifications), len(df))
+    
+    return df, remaining_classifications
+
+def classify_row(row, rules=None, match_mode=None):
+    """Classification a single row dict gets under the current rules."""
+    if rules is None:
+        rules = load_rules()
+    activity = normalize_activity(row["activity"])
+    category = None
+    if float(row["expense"] or 0) > 0:
+        category = rules.match("expense", activity, match_mode)
+    elif float(row["income"] or 0) > 0:
+        category = rules.match("income", activity, match_mode)
+    return category or "No classification"
+
+def addnewValue(classification, activity):
+    if classification[:2] == "IN":
+        with open("income_classification.json", "r") as f:
+            data = json.load(f)
+        # Find the block and add the expense
+        for block in data:
+            if block["classification"] == classification:
+                if activity not in block["income_attributed"]:
+                    block["income_attributed"].append(activity)
+                break
+
+        with open("income_classification.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+    else:
+        with open("expense_classification.json", "r") as f:
+            data = json.load(f)
+        for block in data:
+            if block["classification"] == classification:
+                if activity not in block["expenses_attributed"]:
+                    block["expenses_attributed"].append(activity)
+                break
+        
+        with open("expense_classification.json", "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+    _invalidate_rules()
+    logger.info("added %r to %s", activity, classification)
+
+def addnewClassification(classification, activity, type):
+    if type == "income":
+        with open("income_classification.json", "r") as f:
+            data = json.load(f)
+        
+        # Find the next available number for income classifications
+        existing_numbers = []
+        for item in data:
+            if item["classification"].startswith("IN: "):
+                try:
+                    # Extract number from "IN: XX - Classification"
+                    num_part = item["classification"].split(" - ")[0].split("IN: ")[1]
+                    if num_part.isdigit():
+                        existing_numbers.append(int(num_part))
+                except:
+                    continue
+        
+        # Find the next available number
+        next_number = 1
+        if existing_numbers:
+            next_number = max(existing_numbers) + 1
+        
+        # Format the new classification name
+        new_classification_name = f"IN: {next_number:02d} - {classification}"
+        
+        new_block = {"classification": new_classification_name, "income_attributed": [activity]}
+        data.append(new_block)
+
+        with open("income_classification.json", "w") as f:
+            json.dump(data, f, indent=4)
+    else:
+        with open("expense_classification.json", "r") as f:
+            data = json.load(f)
+        
+        # Find the next available number for expense classifications
+        existing_numbers = []
+        for item in data:
+            try:
+                # Extract number from "XX - Classification" or "XXA - Classification"
+                num_part = item["classification"].split(" - ")[0]
+                if num_part.isdigit():
+                    existing_numbers.append(int(num_part))
+                elif len(num_part) > 2 and num_part[:-1].isdigit() and num_part[-1].isalpha():
+                    # Handle cases like "05A" - extract "05"
+                    existing_numbers.append(int(num_part[:-1]))
+            except:
+                continue
+        
+        # Find the next available number
+        next_number = 1
+        if existing_numbers:
+            next_number = max(existing_numbers) + 1
+        
+        # Format the new classification name
+        new_classification_name = f"{next_number:02d} - {classification}"
+        
+        new_block = {"classification": new_classification_name, "expenses_attributed": [activity]}
+        data.append(new_block)
+
+        with open("expense_classification.json", "w") as f:
+            json.dump(data, f, indent=4)
+    _invalidate_rules()
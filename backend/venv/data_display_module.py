@@ -0,0 +1,89 @@
+from classification_module import load_rules
+
+def _empty_classification_totals():
+    rules = load_rules()
+
+    # Build a unified map of classifications with initial totals of 0
+    classification_totals = {}
+
+    for item in rules.expense_data:
+        classification_totals[item["classification"]] = {"expense": 0, "income": 0}
+
+
+    for item in rules.income_data:
+        if item["classification"] not in classification_totals:
+            classification_totals[item["classification"]] = {"expense": 0, "income": 0}
+
+    return classification_totals
+
+def _to_tuples(classification_totals):
+    # Convert to list of tuples: (classification, expense_sum, income_sum)
+    # Only include classifications that have non-zero values
+    tupled_classifications = []
+    for classification, totals in classification_totals.items():
+        if totals["expense"] > 0 or totals["income"] > 0:
+            tupled_classifications.append((classification, totals["expense"], totals["income"]))
+
+    return tupled_classifications
+
+def create_summed_classifications(data):
+    classification_totals = _empty_classification_totals()
+
+    # Process each row in the data
+    for row in data:
+        expense = float(row[2]) if row[2] else 0
+        income = float(row[3]) if row[3] else 0
+        classification = row[4].strip()
+
+        if classification in classification_totals:
+            if expense > 0:
+                classification_totals[classification]["expense"] += expense
+            if income > 0:
+                classification_totals[classification]["income"] += income
+
+    return _to_tuples(classification_totals)
+
+def period_label(month, period):
+    # month is "YYYY-MM", or "" for rows whose date couldn't be read
+    if not month:
+        return "Unknown"
+    year, month_number = month.split("-")
+    if period == "year":
+        return year
+    if period == "quarter":
+        return f"{year}-Q{(int(month_number) - 1) // 3 + 1}"
+    return month
+
+def summarize_aggregates(aggregates, period=None):
+    """Pivot stored month/classification totals.
+
+    Without a period this returns the same (classification, expense, income)
+    tuples as create_summed_classifications. With "month", "quarter" or
+    "year" it returns one entry per period and classification.
+    """
+    if period is None:
+        classification_totals = _empty_classification_totals()
+        for item in aggregates:
+            if item["classification"] in classification_totals:
+                classification_totals[item["classification"]]["expense"] += item["expense"]
+                classification_totals[item["classification"]]["income"] += item["income"]
+        return _to_tuples(classification_totals)
+
+    order = {name: position for position, name in enumerate(_empty_classification_totals())}
+    period_totals = {}
+    for item in aggregates:
+        if item["classification"] not in order:
+            continue
+        key = (period_label(item["month"], period), item["classification"])
+        totals = period_totals.setdefault(key, {"expense": 0, "income": 0, "count": 0})
+        totals["expense"] += item["expense"]
+        totals["income"] += item["income"]
+        totals["count"] += item["count"]
+
+    return [
+        {"period": label, "classification": classification, **totals}
+        for (label, classification), totals in sorted(
+            period_totals.items(), key=lambda entry: (entry[0][0], order[entry[0][1]])
+        )
+        if totals["expense"] > 0 or totals["income"] > 0
+    ]
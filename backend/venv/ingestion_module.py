@@ -0,0 +1,364 @@
+import asyncio
+import codecs
+import io
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+from classification_module import CompiledRules, classify, load_rules, normalize_activity
+from metrics_module import stage_timer
+from storage_module import iso_date
+
+CSV_HEADERS = ['date', 'activity', 'expense', 'income', 'total']
+
+# How much of the upload is read per await, and how many lines are parsed
+# and classified together on a worker thread
+READ_SIZE = 1024 * 1024
+CHUNK_ROWS = 5000
+
+# Finished jobs are kept around for polling, but only the most recent ones
+MAX_TRACKED_JOBS = 200
+
+_jobs_lock = threading.Lock()
+_jobs = OrderedDict()
+
+
+def create_job(filename, total_bytes=None):
+    job = {
+        "jobId": str(uuid.uuid4()),
+        "filename": filename,
+        "status": "running",
+        "fileId": None,
+        "bytesRead": 0,
+        "totalBytes": total_bytes,
+        "rowsProcessed": 0,
+        "error": None,
+    }
+    with _jobs_lock:
+        _jobs[job["jobId"]] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+    return job
+
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def _update_job(job, **changes):
+    with _jobs_lock:
+        job.update(changes)
+
+
+def parse_chunk(text, start_index, rules=None):
+    """Parse and classify a block of CSV lines.
+
+    Row labels continue from start_index so the idx values in the
+    remaining classifications point at the row's position in the whole
+    file, not just this block.
+    """
+    with stage_timer("parse"):
+        df = pd.read_csv(io.StringIO(text), names=CSV_HEADERS)
+        df.index = pd.RangeIndex(start_index, start_index + len(df))
+        df = df.replace([float('inf'), float('-inf')], None)
+        df = df.fillna(0)
+    with stage_timer("classify"):
+        df, remaining_classifications = classify(df, rules=rules)
+    # Serializing here keeps to_dict off the event loop as well. Rows go back
+    # to statement order, which is the order they are stored in (seq).
+    with stage_timer("serialize"):
+        rows = df.sort_index().to_dict(orient="records")
+    return rows, remaining_classifications
+
+
+async def iter_csv_blocks(upload, job=None, chunk_rows=CHUNK_ROWS, read_size=READ_SIZE):
+    """Yield the upload as blocks of at most chunk_rows complete CSV lines."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    bytes_read = 0
+    partial = ""
+    lines = []
+    while True:
+        data = await upload.read(read_size)
+        bytes_read += len(data)
+        if job is not None:
+            _update_job(job, bytesRead=bytes_read)
+
+        # The last piece may be the start of a line that continues in the
+        # next read, so it is held back until that read arrives
+        with stage_timer("decode"):
+            pieces = (partial + decoder.decode(data, final=not data)).split("\n")
+            partial = pieces.pop()
+            lines.extend(line for line in pieces if line.strip())
+
+        while len(lines) >= chunk_rows:
+            yield "\n".join(lines[:chunk_rows])
+            lines = lines[chunk_rows:]
+        if not data:
+            break
+
+    if partial.strip():
+        lines.append(partial)
+    if lines:
+        yield "\n".join(lines)
+
+
+async def ingest_csv(upload, storage, job=None, folder_id=None):
+    """Stream an uploaded statement into storage, one classified block at a time.
+
+    Yields a "file" event once the file record exists, a "rows" event per
+    block after it has been persisted, and a final "done" event with the
+    file's metadata. If anything fails, or the upload turns out to have no
+    rows, the partially stored file is removed.
+    """
+    rules = await run_in_threadpool(load_rules)
+    file_id = str(uuid.uuid4())
+    file_record = {
+        "id": file_id,
+        "filename": upload.filename,
+        "uploadDate": datetime.now().isoformat(),
+        "totalRecords": 0,
+        "totalExpense": 0.0,
+        "totalIncome": 0.0,
+    }
+    await run_in_threadpool(storage.create_file, file_record, folder_id)
+    if job is not None:
+        _update_job(job, fileId=file_id)
+    yield {"type": "file", "fileId": file_id, "jobId": job["jobId"] if job else None}
+
+    rows_processed = 0
+    completed = False
+    error = "Upload was cancelled"
+    try:
+        async for block in iter_csv_blocks(upload, job):
+            rows, remaining_classifications = await run_in_threadpool(parse_chunk, block, rows_processed, rules)
+            with stage_timer("persist"):
+                await run_in_threadpool(storage.append_rows, file_id, rows, rows_processed)
+            rows_processed += len(rows)
+            if job is not None:
+                _update_job(job, rowsProcessed=rows_processed)
+            yield {"type": "rows", "rows": rows, "rem_class": remaining_classifications}
+        if rows_processed == 0:
+            raise ValueError("The uploaded file has no rows")
+        completed = True
+    except Exception as exc:
+        error = str(exc)
+        raise
+    finally:
+        # Also reached when a streaming client disconnects (GeneratorExit or
+        # CancelledError). A cancelled task may not get to await again, and
+        # the delete can wait on SQLite's write lock, so it is handed to a
+        # worker thread without waiting for it.
+        if not completed:
+            asyncio.get_running_loop().run_in_executor(None, storage.delete_file, file_id)
+            if job is not None:
+                _update_job(job, status="failed", error=error)
+
+    if job is not None:
+        _update_job(job, status="done")
+    file_meta = await run_in_threadpool(storage.get_file, file_id)
+    yield {"type": "done", "file": file_meta}
+
+
+def expand_statements(filename, content):
+    """Return (filename, bytes) pairs for an upload, unpacking zip archives."""
+    if not filename.lower().endswith(".zip"):
+        return [(filename, content)]
+    statements = []
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        for member in archive.infolist():
+            name = member.filename
+            if member.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".csv"):
+                continue
+            statements.append((os.path.basename(name), archive.read(member)))
+    return statements
+
+
+# Compiled once per bulk-import worker process by _init_bulk_worker
+_worker_rules = None
+
+
+def _init_bulk_worker(expense_data, income_data):
+    global _worker_rules
+    _worker_rules = CompiledRules(expense_data, income_data)
+
+
+def classify_statement(filename, content):
+    """Parse and classify one whole statement inside a bulk-import worker."""
+    started = time.perf_counter()
+    df = pd.read_csv(io.BytesIO(content), names=CSV_HEADERS)
+    df = df.replace([float('inf'), float('-inf')], None)
+    df = df.fillna(0)
+    parsed = time.perf_counter()
+    df, remaining_classifications = classify(df, rules=_worker_rules)
+    # Back to statement order so overlapping exports line up when de-duplicating
+    df = df.sort_index()
+    classified = time.perf_counter()
+    return {
+        "filename": filename,
+        "rows": df.to_dict(orient="records"),
+        "unmatched": [row["idx"] for row in remaining_classifications],
+        "parseSeconds": parsed - started,
+        "classifySeconds": classified - parsed,
+    }
+
+
+def _fingerprint(row):
+    # Exports switched from MM/DD/YYYY to YYYY-MM-DD in Nov 2024, so dates are
+    # compared in ISO form; anything unparseable is compared as written
+    date = str(row["date"]).strip()
+    return (
+        iso_date(date) or date,
+        normalize_activity(row["activity"]),
+        round(float(row["expense"] or 0), 2),
+        round(float(row["income"] or 0), 2),
+        round(float(row["total"] or 0), 2),
+    )
+
+
+def deduplicate_statements(results):
+    """Drop transactions already covered by an earlier statement in the batch.
+
+    A transaction that appears n times in one export and m times in an
+    overlapping one is kept max(n, m) times, so genuine repeats inside a
+    single statement survive.
+    """
+    seen = Counter()
+    for result in results:
+        counts = Counter()
+        kept = []
+        new_positions = {}
+        for position, row in enumerate(result["rows"]):
+            key = _fingerprint(row)
+            counts[key] += 1
+            if counts[key] > seen[key]:
+                new_positions[position] = len(kept)
+                kept.append(row)
+        for key, count in counts.items():
+            seen[key] = max(seen[key], count)
+
+        result["duplicatesRemoved"] = len(result["rows"]) - len(kept)
+        result["rows"] = kept
+        result["rem_class"] = [
+            dict(kept[new_positions[position]], idx=new_positions[position])
+            for position in result["unmatched"]
+            if position in new_positions
+        ]
+
+
+async def bulk_import(statements, storage, resolve_folder=None, failed=None, max_workers=None):
+    """Classify many statements in parallel and store them in one write.
+
+    Yields a "progress" event as each statement finishes classifying, then
+    a "done" event with per-file results and timings. resolve_folder, if
+    given, is called on a worker thread once there is something to store
+    and returns the folder id to store it in, so a batch that fails
+    entirely leaves no folder behind. failed lists uploads that were
+    rejected before classification; they are reported with the rest.
+    """
+    started = time.perf_counter()
+    rules = await run_in_threadpool(load_rules)
+    max_workers = max_workers or min(len(statements), os.cpu_count() or 1) or 1
+
+    loop = asyncio.get_running_loop()
+    results = [None] * len(statements)
+    errors = {}
+    pool = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_bulk_worker,
+        initargs=(rules.expense_data, rules.income_data),
+    )
+    try:
+        futures = {
+            loop.run_in_executor(pool, classify_statement, filename, content): position
+            for position, (filename, content) in enumerate(statements)
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                position = futures[future]
+                filename = statements[position][0]
+                try:
+                    results[position] = future.result()
+                    event = {
+                        "type": "progress",
+                        "filename": filename,
+                        "rows": len(results[position]["rows"]),
+                        "parseSeconds": results[position]["parseSeconds"],
+                        "classifySeconds": results[position]["classifySeconds"],
+                    }
+                except Exception as exc:
+                    errors[position] = str(exc)
+                    event = {"type": "progress", "filename": filename, "error": errors[position]}
+                event["completed"] = sum(1 for f in futures if f.done())
+                event["total"] = len(statements)
+                yield event
+    finally:
+        # A with-block would shut down with wait=True, which blocks the event
+        # loop until every queued statement is classified when a streaming
+        # client goes away; queued work is dropped and the workers exit on
+        # their own instead
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    failed = list(failed or []) + [
+        {"filename": statements[position][0], "error": error}
+        for position, error in sorted(errors.items())
+    ]
+    results = [result for result in results if result is not None]
+    deduplicate_statements(results)
+
+    entries = []
+    for result in results:
+        # A statement wholly covered by the others adds nothing to store
+        if not result["rows"] and result["duplicatesRemoved"]:
+            result["fileId"] = None
+            continue
+        result["fileId"] = str(uuid.uuid4())
+        rows = result["rows"]
+        record = {
+            "id": result["fileId"],
+            "filename": result["filename"],
+            "uploadDate": datetime.now().isoformat(),
+            "totalRecords": len(rows),
+            "totalExpense": float(sum(row["expense"] for row in rows)),
+            "totalIncome": float(sum(row["income"] for row in rows)),
+        }
+        entries.append((record, rows))
+
+    folder_id = None
+    if entries and resolve_folder is not None:
+        folder_id = await run_in_threadpool(resolve_folder)
+
+    store_started = time.perf_counter()
+    await run_in_threadpool(storage.add_files, entries, folder_id)
+    finished = time.perf_counter()
+
+    yield {
+        "type": "done",
+        "folderId": folder_id,
+        "files": [
+            {
+                "fileId": result["fileId"],
+                "filename": result["filename"],
+                "totalRecords": len(result["rows"]),
+                "duplicatesRemoved": result["duplicatesRemoved"],
+                "rem_class": result["rem_class"],
+                "parseSeconds": result["parseSeconds"],
+                "classifySeconds": result["classifySeconds"],
+            }
+            for result in results
+        ],
+        "failed": failed,
+        "storeSeconds": finished - store_started,
+        "totalSeconds": finished - started,
+    }
@@ -0,0 +1,402 @@
+import uvicorn
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import List
+import pandas as pd
+from fastapi import UploadFile, File, Body, Form, Request
+from classification_module import *
+from data_display_module import *  # Assuming classify.py is in the same directory
+from storage_module import ROW_COLUMNS, open_storage
+from ingestion_module import bulk_import, create_job, expand_statements, get_job, ingest_csv
+from metrics_module import (
+    REQUEST_COUNT,
+    REQUEST_DURATION,
+    configure_logging,
+    profile_request,
+    render_metrics,
+    should_profile,
+)
+import json
+from datetime import datetime
+import uuid
+import hashlib
+import time
+import zipfile
+
+index = -1
+
+configure_logging()
+
+app = FastAPI()
+
+origins = [
+    "http://localhost:5173",
+    "https://your-production-domain.com",  # Replace with your production domain
+]
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag"],
+)   
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # For streamed responses this measures the time until streaming starts
+    started = time.perf_counter()
+    # An unhandled exception becomes a 500 further out, so it is counted as one
+    status = 500
+    try:
+        if should_profile():
+            with profile_request(f"{request.method} {request.url.path}"):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template (/file-data/{file_id}) keeps ids out of the labels
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        REQUEST_COUNT.inc(method=request.method, route=path, status=status)
+        REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method, route=path)
+
+# File storage (SQLite by default; uploaded_files.json is imported on first run)
+storage = open_storage()
+
+def _ndjson_response(events):
+    # The 200 status is already sent by the time a later event fails, so the
+    # failure is reported as a final {"type": "error"} line instead
+    async def ndjson():
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/uploadcsv")
+async def upload_csv(file: UploadFile = File(...), stream: bool = False):
+    # Blocks are parsed, classified and stored on worker threads as they are
+    # read, so a large statement never holds up the event loop
+    job = create_job(file.filename, file.size)
+    events = ingest_csv(file, storage, job)
+
+    if stream:
+        # NDJSON: one line per stored block, then a summary line. The first
+        # line carries the jobId, so this is the mode to use for progress;
+        # without stream the jobId only arrives once the job has finished.
+        return _ndjson_response(events)
+
+    parsed_data = []
+    remaning_classifications = []
+    try:
+        async for event in events:
+            if event["type"] == "file":
+                file_id = event["fileId"]
+            elif event["type"] == "rows":
+                parsed_data.extend(event["rows"])
+                remaning_classifications.extend(event["rem_class"])
+    except ValueError as e:
+        return {"error": str(e), "jobId": job["jobId"]}
+    parsed_data.sort(key=lambda row: row["classification"])
+    
+    if remaning_classifications == []:
+        return {"parsed": parsed_data, "fileId": file_id, "jobId": job["jobId"]}
+    else:
+        return {"rem_class": remaning_classifications, "parsed": parsed_data, "fileId": file_id, "jobId": job["jobId"]}
+
+@app.post("/bulk-upload")
+async def bulk_upload(
+    files: List[UploadFile] = File(...),
+    folder_name: str = Form(None),
+    stream: bool = False,
+):
+    # Accepts any mix of CSV statements and zip archives of them
+    statements = []
+    failed = []
+    for file in files:
+        try:
+            statements.extend(expand_statements(file.filename, await file.read()))
+        except zipfile.BadZipFile as e:
+            failed.append({"filename": file.filename, "error": str(e)})
+    if not statements:
+        return {"error": "No CSV files found", "failed": failed}
+
+    def resolve_folder():
+        # Only called once something classified, so failed batches leave no empty folder
+        folder = storage.find_folder_by_name(folder_name)
+        return folder["id"] if folder else _create_folder(folder_name)
+
+    events = bulk_import(statements, storage, resolve_folder if folder_name else None, failed)
+
+    if stream:
+        # NDJSON: a progress line as each file is classified, then the summary
+        return _ndjson_response(events)
+
+    async for event in events:
+        if event["type"] == "done":
+            summary = event
+    summary.pop("type")
+    return summary
+
+@app.get("/upload-jobs/{job_id}")
+def get_upload_job(job_id: str):
+    # Progress for uploads started with stream=true, whose first line gives the jobId
+    job = get_job(job_id)
+    if job is None:
+        return {"error": "Job not found"}
+    return job
+
+@app.get("/stored-files")
+def get_stored_files():
+    # Folders (with their files' metadata) followed by files not in a folder
+    return storage.list_items()
+
+def _etag(*parts):
+    # Weak, since GZipMiddleware may re-encode the body
+    return 'W/"' + hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20] + '"'
+
+def _not_modified(request, etag):
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+@app.get("/file-data/{file_id}")
+def get_file_data(
+    file_id: str,
+    request: Request,
+    offset: int = 0,
+    limit: int = None,
+    cursor: str = None,
+    sort: str = "seq",
+    order: str = "asc",
+    classification: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    min_amount: float = None,
+    max_amount: float = None,
+    format: str = "records",
+):
+    # With no query parameters this is still every row in upload order
+    version = storage.file_version(file_id)
+    if version is None:
+        return {"error": "File not found"}
+    if format not in ("records", "columnar"):
+        return {"error": "format must be records or columnar"}
+
+    # The file's version changes whenever its rows do
+    etag = _etag("file-data", file_id, version, request.url.query)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        rows, total, next_cursor = storage.query_rows(
+            file_id,
+            offset=max(0, offset),
+            # No limit means every row; SQLite would read a negative one the same way
+            limit=None if limit is None else max(1, limit),
+            cursor=cursor,
+            sort=sort,
+            descending=order == "desc",
+            classification=classification,
+            date_from=date_from,
+            date_to=date_to,
+            min_amount=min_amount,
+            max_amount=max_amount,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+
+    if format == "columnar":
+        # One array per column instead of repeating every key on every row
+        data = {column: [row[column] for row in rows] for column in ROW_COLUMNS}
+        content = {"columns": ROW_COLUMNS, "data": data, "total": total, "nextCursor": next_cursor}
+    else:
+        content = {"data": rows, "total": total, "nextCursor": next_cursor}
+    return JSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.delete("/file/{file_id}")
+def delete_file(file_id: str):
+    storage.delete_file(file_id)
+    return {"message": "File deleted successfully"}
+
+@app.post("/reclassify")
+async def reclassify(parsed: list = Body(...)):
+    df = pd.DataFrame(parsed)
+    df, _ = classify(df)  # This will use the updated JSON files
+    parsed_data = df.to_dict(orient="records")
+    return {"parsed": parsed_data}
+
+@app.post("/addnewvalue")
+def add_new_activity_post(
+    classification: str = Body(...), 
+    activity: str = Body(...),
+):
+    addnewValue(classification,activity)
+    return {
+        "message": "Expense added successfully",
+        "classification": classification,
+        **_reclassify_stored(activity)
+    }
+
+@app.post("/addnewclassification")
+def add_new_classification(
+    new_classification: str = Body(...), 
+    selected_activity: str = Body(...),
+    chosen_type: str = Body(...)
+):
+    addnewClassification(classification=new_classification,activity=selected_activity,type=chosen_type)
+    return{
+        "message": "Classification added succesfully",
+        **_reclassify_stored(selected_activity)
+    }
+
+def _reclassify_stored(activity):
+    # Only rows indexed under this activity can change, wherever they are stored.
+    # This waits on SQLite's write lock, so callers must stay off the event loop.
+    rules = load_rules()
+    changed = storage.reclassify_activity(
+        activity,
+        lambda row: classify_row(row, rules),
+        prefix=MATCH_MODE == "prefix",
+    )
+    file_ids = sorted({row["fileId"] for row in changed})
+    return {
+        "changed": changed,
+        "files": [storage.get_file(file_id) for file_id in file_ids],
+    }
+
+
+def _options_response(request, kind):
+    rules = load_rules()
+    etag = _etag("options", kind, rules.version)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse({"options": rules.options[kind]}, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/expense-options")
+def get_expense_classification_options(request: Request):
+    return _options_response(request, "expense")
+
+@app.get("/income-options")
+def get_income_classification_options(request: Request):
+    return _options_response(request, "income")
+
+
+@app.post("/pivot-table")
+def sum_classifications(classifications: List = Body(...)):
+    summed_classifications = create_summed_classifications(classifications)
+    return summed_classifications
+
+@app.get("/pivot")
+def stored_pivot(
+    file_id: str = None,
+    folder_id: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    period: str = None,
+):
+    # Reads the totals kept up to date by storage, so no rows are posted back.
+    # date_from/date_to are ISO dates (YYYY-MM-DD); period is month, quarter or year.
+    if period not in (None, "month", "quarter", "year"):
+        return {"error": "period must be month, quarter or year"}
+    try:
+        aggregates = storage.summarize(file_id=file_id, folder_id=folder_id, date_from=date_from, date_to=date_to)
+    except ValueError:
+        return {"error": "Dates must be YYYY-MM-DD"}
+    return summarize_aggregates(aggregates, period)
+
+@app.get("/search")
+def search_transactions(
+    q: str = None,
+    classification: str = None,
+    folder_id: str = None,
+    date_from: str = None,
+    date_to: str = None,
+    min_amount: float = None,
+    max_amount: float = None,
+    limit: int = 50,
+    offset: int = 0,
+):
+    # Searches every stored statement; q matches words (last one as a prefix) in the activity
+    return storage.search(
+        q,
+        classification=classification,
+        folder_id=folder_id,
+        date_from=date_from,
+        date_to=date_to,
+        min_amount=min_amount,
+        max_amount=max_amount,
+        limit=max(1, min(limit, 500)),
+        offset=max(0, offset),
+    )
+
+@app.post("/create-folder")
+def create_folder(folder_data: dict = Body(...)):
+    folder_name = folder_data.get("folder_name")
+    if not folder_name:
+        return {"error": "Folder name is required"}
+    
+    # Check if folder already exists
+    if storage.find_folder_by_name(folder_name):
+        return {"error": "Folder already exists"}
+    
+    folder_id = _create_folder(folder_name)
+    return {"message": "Folder created successfully", "folderId": folder_id}
+
+def _create_folder(folder_name):
+    folder_id = str(uuid.uuid4())
+    folder_record = {
+        "id": folder_id,
+        "name": folder_name,
+        "createdDate": datetime.now().isoformat(),
+    }
+    storage.create_folder(folder_record)
+    return folder_id
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug-stored")
+def debug_stored_files():
+    """Debug endpoint to see what's actually stored"""
+    files = storage.export_items()
+    return {"files": files, "count": len(files)}
+
+@app.post("/rename-file")
+def rename_file(file_id: str = Body(...), new_name: str = Body(...)):
+    if storage.rename_file(file_id, new_name):
+        return {"message": "File renamed successfully"}
+    
+    return {"error": "File not found"}
+
+@app.post("/move-file")
+def move_file(file_id: str = Body(...), folder_id: str = Body(...)):
+    if not storage.get_file(file_id):
+        return {"error": "File not found"}
+    if not storage.get_folder(folder_id):
+        return {"error": "Folder not found"}
+    
+    storage.move_file(file_id, folder_id)
+    return {"message": "File moved successfully"}
+
+@app.delete("/folder/{folder_id}")
+def delete_folder(folder_id: str):
+    storage.delete_folder(folder_id)
+    return {"message": "Folder deleted successfully"}
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8000)
+
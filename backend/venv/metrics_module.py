@@ -0,0 +1,148 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("easyaccounting")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Share of requests to profile, from 0 (off) to 1 (every request)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+
+
+def configure_logging(level=None):
+    """Send the app's logs to stderr at LOG_LEVEL (INFO unless set)."""
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    logger.setLevel(level.upper())
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        # label key -> [per-bucket counts, sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+REQUEST_COUNT = Counter("http_requests_total", "HTTP requests handled, by route and status.")
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time to produce a response, by route.")
+UPLOAD_STAGE_DURATION = Histogram(
+    "upload_stage_duration_seconds",
+    "Time spent per upload stage (decode, parse, classify, serialize, persist).",
+)
+RULE_RELOADS = Counter("classification_rule_reloads_total", "Times the classification rule files were recompiled.")
+STORAGE_OPERATIONS = Counter("storage_operations_total", "Storage reads and write transactions.")
+
+METRICS = [REQUEST_COUNT, REQUEST_DURATION, UPLOAD_STAGE_DURATION, RULE_RELOADS, STORAGE_OPERATIONS]
+
+
+def stage_timer(stage):
+    """Time one stage of an upload, e.g. `with stage_timer("parse"):`."""
+    return UPLOAD_STAGE_DURATION.time(stage=stage)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def should_profile():
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def profile_request(label):
+    """Profile the enclosed block and log its 25 most expensive calls.
+
+    cProfile only follows the thread it was started on, so this covers
+    time spent on the event loop; work handed to the threadpool (sync
+    endpoints, block parsing) shows up as the await that waited for it.
+    Only one request is profiled at a time; overlapping ones run as usual.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_lock.release()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        logger.info("profile for %s\n%s", label, output.getvalue())
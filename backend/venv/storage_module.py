@@ -0,0 +1,833 @@
+import base64
+import calendar
+import json
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from classification_module import normalize_activity
+from metrics_module import STORAGE_OPERATIONS
+
+DATABASE_FILE = os.environ.get("EASYACCOUNTING_DB", "easyaccounting.db")
+LEGACY_STORAGE_FILE = "uploaded_files.json"
+
+ROW_COLUMNS = ["date", "activity", "expense", "income", "total", "classification"]
+
+
+class StorageBackend(ABC):
+    """Everything main.py needs from a place that keeps uploaded files.
+
+    Files are returned as metadata dicts shaped like the /stored-files
+    response (id, filename, uploadDate, totalRecords, totalExpense,
+    totalIncome); rows are dicts with the ROW_COLUMNS keys, kept in
+    statement order (seq). A backend that leaves any abstract method out
+    fails when it is instantiated.
+    """
+
+    @abstractmethod
+    def list_items(self):
+        """Folder dicts (id, type "folder", name, createdDate, files) then loose file metadata."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def export_items(self):
+        """list_items() with every file's rows added under "data"."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_file(self, file_id):
+        """File metadata, or None if there is no such file."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_file_rows(self, file_id):
+        """Every row of the file in statement order, or None if there is no such file."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def file_version(self, file_id):
+        """A number that changes whenever the file's rows do, or None if there is no such file."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_rows(self, file_id, offset=0, limit=None, cursor=None, sort="seq", descending=False,
+                   classification=None, date_from=None, date_to=None, min_amount=None, max_amount=None):
+        """(rows, total matching, next_cursor or None); ValueError for a bad sort or cursor."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_file(self, record, rows, folder_id=None):
+        """Store a file record with all its rows; returns nothing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_files(self, entries, folder_id=None):
+        """Store several (record, rows) pairs atomically; returns nothing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_file(self, record, folder_id=None):
+        """Store a file record with no rows yet, for append_rows to fill; returns nothing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_rows(self, file_id, rows, start_seq):
+        """Add rows numbered from start_seq and fold them into the file's totals; returns nothing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rename_file(self, file_id, new_name):
+        """True if the file existed and was renamed."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def move_file(self, file_id, folder_id):
+        """True if the file existed and was moved into the folder."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_file(self, file_id):
+        """True if the file existed; its rows are deleted with it."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_folder(self, record):
+        """Store a folder record (id, name, createdDate); returns nothing."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_folder(self, folder_id):
+        """Folder dict (id, name, created_date), or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_folder_by_name(self, name):
+        """Folder dict (id, name, created_date), or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_folder(self, folder_id):
+        """True if the folder existed; its files and their rows are deleted with it."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def summarize(self, file_id=None, folder_id=None, date_from=None, date_to=None):
+        """List of {month, classification, expense, income, count} dicts; ValueError for a bad date."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def reclassify_activity(self, activity, classify_row, prefix=False):
+        """Rows whose classification changed, with fileId, idx and previousClassification added."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, text=None, classification=None, folder_id=None, date_from=None, date_to=None,
+               min_amount=None, max_amount=None, limit=50, offset=0):
+        """{"results": rows with fileId, filename, folderId and idx, "total": int, "facets": list}."""
+        raise NotImplementedError
+
+    def import_legacy_json(self, path=LEGACY_STORAGE_FILE):
+        """Number of files imported from uploaded_files.json; backends may ignore it."""
+        return 0
+
+
+def iso_date(value):
+    # Statements use MM/DD/YYYY (YYYY-MM-DD from Nov 2024); anything
+    # unparseable just isn't date-indexed
+    for fmt in ("%m/%d/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _native(value):
+    # numpy scalars coming out of pandas can't be bound by sqlite3 directly
+    return value.item() if hasattr(value, "item") else value
+
+
+def _execute_script(conn, script):
+    # executescript() would commit the surrounding migration transaction,
+    # so statements are run one at a time instead
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+def _migration_initial_schema(conn):
+    _execute_script(conn, """
+        CREATE TABLE folders (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            created_date TEXT NOT NULL
+        );
+        CREATE TABLE files (
+            id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            upload_date TEXT NOT NULL,
+            total_records INTEGER NOT NULL,
+            total_expense REAL NOT NULL,
+            total_income REAL NOT NULL,
+            folder_id TEXT REFERENCES folders(id) ON DELETE CASCADE
+        );
+        CREATE INDEX files_folder_idx ON files(folder_id);
+        CREATE INDEX files_upload_date_idx ON files(upload_date);
+        CREATE TABLE rows (
+            id INTEGER PRIMARY KEY,
+            file_id TEXT NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            date TEXT,
+            date_iso TEXT,
+            activity TEXT,
+            expense REAL,
+            income REAL,
+            total REAL,
+            classification TEXT
+        );
+        CREATE UNIQUE INDEX rows_file_seq_idx ON rows(file_id, seq);
+        CREATE INDEX rows_date_idx ON rows(date_iso);
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+
+
+def _migration_aggregates(conn):
+    # Per file, month and classification sums of positive expense and
+    # income, kept in step with rows so pivots never re-scan transactions
+    _execute_script(conn, """
+        CREATE TABLE aggregates (
+            file_id TEXT NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+            month TEXT NOT NULL,
+            classification TEXT NOT NULL,
+            expense REAL NOT NULL DEFAULT 0,
+            income REAL NOT NULL DEFAULT 0,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (file_id, month, classification)
+        );
+        CREATE INDEX aggregates_month_idx ON aggregates(month);
+        INSERT INTO aggregates (file_id, month, classification, expense, income, row_count)
+        SELECT file_id, COALESCE(substr(date_iso, 1, 7), ''), COALESCE(classification, ''),
+               TOTAL(MAX(COALESCE(expense, 0), 0)), TOTAL(MAX(COALESCE(income, 0), 0)), COUNT(*)
+        FROM rows GROUP BY 1, 2, 3;
+    """)
+
+
+def _migration_activity_index(conn):
+    # Inverted index from normalized activity to the rows carrying it, so
+    # a new keyword only touches the rows it can affect
+    conn.create_function("normalize_activity", 1, normalize_activity, deterministic=True)
+    _execute_script(conn, """
+        ALTER TABLE rows ADD COLUMN activity_norm TEXT;
+        UPDATE rows SET activity_norm = normalize_activity(activity);
+        CREATE INDEX rows_activity_idx ON rows(activity_norm);
+    """)
+
+
+def _migration_file_version(conn):
+    # Bumped whenever a file's rows change; used to validate cached reads
+    conn.execute("ALTER TABLE files ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migration_search_index(conn):
+    # Full-text index over every stored row's activity. It reads its text
+    # from rows (external content) and triggers keep it in step with row
+    # inserts and deletes, including those cascaded from files/folders.
+    # Filenames and folders are joined in at query time, so renames and
+    # moves need no reindexing.
+    _execute_script(conn, """
+        CREATE VIRTUAL TABLE rows_search USING fts5(
+            activity, content='rows', content_rowid='id', prefix='2 3 4'
+        );
+        CREATE TRIGGER rows_search_insert AFTER INSERT ON rows BEGIN
+            INSERT INTO rows_search (rowid, activity) VALUES (new.id, new.activity);
+        END;
+        CREATE TRIGGER rows_search_delete AFTER DELETE ON rows BEGIN
+            INSERT INTO rows_search (rows_search, rowid, activity) VALUES ('delete', old.id, old.activity);
+        END;
+        CREATE TRIGGER rows_search_update AFTER UPDATE OF activity ON rows BEGIN
+            INSERT INTO rows_search (rows_search, rowid, activity) VALUES ('delete', old.id, old.activity);
+            INSERT INTO rows_search (rowid, activity) VALUES (new.id, new.activity);
+        END;
+        INSERT INTO rows_search (rows_search) VALUES ('rebuild');
+    """)
+
+
+# Applied in order; PRAGMA user_version records how many have run
+_MIGRATIONS = [
+    _migration_initial_schema,
+    _migration_aggregates,
+    _migration_activity_index,
+    _migration_file_version,
+    _migration_search_index,
+]
+
+
+def _search_query(text):
+    """Turn free text into an FTS5 query: every word must appear, the last as a prefix.
+
+    Words are split the way the index tokenizes activities, so
+    "APPLE.COM/BILL" looks for apple, com and bill, and "e-trans" finds
+    E-TRANSFER rows while the user is still typing.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+# Sort keys accepted by query_rows; NULLs are folded so keyset cursors
+# always compare against a concrete value
+SORT_EXPRESSIONS = {
+    "seq": "seq",
+    "date": "COALESCE(date_iso, '')",
+    "activity": "COALESCE(activity_norm, '')",
+    "expense": "COALESCE(expense, 0)",
+    "income": "COALESCE(income, 0)",
+    "total": "COALESCE(total, 0)",
+    "classification": "COALESCE(classification, '')",
+}
+
+
+def _encode_cursor(sort_value, seq):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, seq]).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    try:
+        sort_value, seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return sort_value, seq
+
+
+def _aggregate_deltas(rows, sign=1):
+    deltas = {}
+    for row in rows:
+        date_iso = iso_date(row.get("date"))
+        key = (date_iso[:7] if date_iso else "", row.get("classification") or "")
+        delta = deltas.setdefault(key, [0.0, 0.0, 0])
+        delta[0] += sign * max(float(row.get("expense") or 0), 0)
+        delta[1] += sign * max(float(row.get("income") or 0), 0)
+        delta[2] += sign
+    return deltas
+
+
+def _apply_aggregate_deltas(conn, file_id, deltas):
+    conn.executemany(
+        "INSERT INTO aggregates (file_id, month, classification, expense, income, row_count) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (file_id, month, classification) DO UPDATE SET "
+        "expense = expense + excluded.expense, income = income + excluded.income, "
+        "row_count = row_count + excluded.row_count",
+        ((file_id, month, classification, expense, income, count)
+         for (month, classification), (expense, income, count) in deltas.items()),
+    )
+    conn.execute("DELETE FROM aggregates WHERE file_id = ? AND row_count <= 0", (file_id,))
+
+
+def _split_date_range(date_from, date_to):
+    """Split an ISO date range into whole months and leftover partial spans.
+
+    Returns (first_month, last_month, partial_spans); whole months are
+    read from aggregates and the partial spans from the rows themselves.
+    Open ends come back as "0000" / "\uffff"; None for both months means
+    there are no whole months to read. An inverted range matches nothing.
+    """
+    start = date.fromisoformat(date_from) if date_from else None
+    end = date.fromisoformat(date_to) if date_to else None
+
+    def month_end(day):
+        return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+    if start and end and start > end:
+        return None, None, []
+
+    if start and end and (start.year, start.month) == (end.year, end.month):
+        if start.day == 1 and end == month_end(end):
+            return start.isoformat()[:7], end.isoformat()[:7], []
+        return None, None, [(start.isoformat(), end.isoformat())]
+
+    first_month = last_month = None
+    partial_spans = []
+    if start:
+        if start.day == 1:
+            first_month = start.isoformat()[:7]
+        else:
+            partial_spans.append((start.isoformat(), month_end(start).isoformat()))
+            first_month = (month_end(start) + timedelta(days=1)).isoformat()[:7]
+    if end:
+        if end == month_end(end):
+            last_month = end.isoformat()[:7]
+        else:
+            partial_spans.append((end.replace(day=1).isoformat(), end.isoformat()))
+            last_month = (end.replace(day=1) - timedelta(days=1)).isoformat()[:7]
+    if first_month and last_month and first_month > last_month:
+        # Only the partial spans are left, e.g. the 15th to the 10th of next month
+        return None, None, partial_spans
+    return first_month or "0000", last_month or "\uffff", partial_spans
+
+
+class SQLiteStorage(StorageBackend):
+    """Default backend: one SQLite database with metadata and rows split."""
+
+    def __init__(self, path=DATABASE_FILE):
+        self.path = path
+        self._local = threading.local()
+        self._migrate()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; writes open their own transaction below
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _read(self):
+        STORAGE_OPERATIONS.inc(kind="read")
+        return self._connection()
+
+    @contextmanager
+    def _transaction(self):
+        STORAGE_OPERATIONS.inc(kind="write")
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so two concurrent
+        # requests queue instead of overwriting each other's changes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate(self):
+        with self._transaction() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for migration in _MIGRATIONS[version:]:
+                migration(conn)
+            conn.execute(f"PRAGMA user_version = {len(_MIGRATIONS)}")
+
+    def _file_meta(self, row):
+        return {
+            "id": row["id"],
+            "filename": row["filename"],
+            "uploadDate": row["upload_date"],
+            "totalRecords": row["total_records"],
+            "totalExpense": row["total_expense"],
+            "totalIncome": row["total_income"],
+        }
+
+    def _insert_file(self, conn, record, rows, folder_id=None):
+        conn.execute(
+            "INSERT INTO files (id, filename, upload_date, total_records, total_expense, total_income, folder_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record["id"], record["filename"], record["uploadDate"], record["totalRecords"],
+             record["totalExpense"], record["totalIncome"], folder_id),
+        )
+        self._insert_rows(conn, record["id"], rows)
+
+    def _insert_rows(self, conn, file_id, rows, start_seq=0):
+        conn.executemany(
+            "INSERT INTO rows (file_id, seq, date, date_iso, activity, activity_norm, expense, income, total, classification) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (file_id, seq, _native(row.get("date")), iso_date(row.get("date")),
+                 _native(row.get("activity")), normalize_activity(row.get("activity")),
+                 _native(row.get("expense")), _native(row.get("income")),
+                 _native(row.get("total")), _native(row.get("classification")))
+                for seq, row in enumerate(rows, start_seq)
+            ),
+        )
+        _apply_aggregate_deltas(conn, file_id, _aggregate_deltas(rows))
+
+    def list_items(self):
+        conn = self._read()
+        folder_files = {}
+        loose_files = []
+        for row in conn.execute("SELECT * FROM files ORDER BY upload_date"):
+            if row["folder_id"] is None:
+                loose_files.append(self._file_meta(row))
+            else:
+                folder_files.setdefault(row["folder_id"], []).append(self._file_meta(row))
+
+        result = []
+        for row in conn.execute("SELECT * FROM folders ORDER BY created_date"):
+            result.append({
+                "id": row["id"],
+                "type": "folder",
+                "name": row["name"],
+                "createdDate": row["created_date"],
+                "files": folder_files.get(row["id"], []),
+            })
+        return result + loose_files
+
+    def export_items(self):
+        items = self.list_items()
+        for item in items:
+            for file in item.get("files", [item]):
+                file["data"] = self.get_file_rows(file["id"])
+        return items
+
+    def get_file(self, file_id):
+        row = self._read().execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        return self._file_meta(row) if row else None
+
+    def get_file_rows(self, file_id):
+        conn = self._read()
+        if conn.execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is None:
+            return None
+        cursor = conn.execute(
+            f"SELECT {', '.join(ROW_COLUMNS)} FROM rows WHERE file_id = ? ORDER BY seq",
+            (file_id,),
+        )
+        return [dict(row) for row in cursor]
+
+    def file_version(self, file_id):
+        row = self._read().execute("SELECT version FROM files WHERE id = ?", (file_id,)).fetchone()
+        return row["version"] if row else None
+
+    def query_rows(self, file_id, offset=0, limit=None, cursor=None, sort="seq", descending=False,
+                   classification=None, date_from=None, date_to=None, min_amount=None, max_amount=None):
+        """Return (rows, total, next_cursor) for a filtered, sorted page of a file.
+
+        total counts every row matching the filters. Pages can be walked
+        with offset or, cheaper for deep pages, by passing back next_cursor.
+        An amount is a row's expense or income, whichever is set.
+        """
+        if sort not in SORT_EXPRESSIONS:
+            raise ValueError(f"Cannot sort by {sort}")
+        sort_expression = SORT_EXPRESSIONS[sort]
+
+        conditions = ["file_id = ?"]
+        params = [file_id]
+        if classification is not None:
+            conditions.append("classification = ?")
+            params.append(classification)
+        if date_from is not None:
+            conditions.append("date_iso >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("date_iso <= ?")
+            params.append(date_to)
+        if min_amount is not None:
+            conditions.append("MAX(COALESCE(expense, 0), COALESCE(income, 0)) >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append("MAX(COALESCE(expense, 0), COALESCE(income, 0)) <= ?")
+            params.append(max_amount)
+
+        conn = self._read()
+        where = " AND ".join(conditions)
+        total = conn.execute(f"SELECT COUNT(*) FROM rows WHERE {where}", params).fetchone()[0]
+
+        if cursor is not None:
+            sort_value, seq = _decode_cursor(cursor)
+            where += f" AND ({sort_expression}, seq) {'<' if descending else '>'} (?, ?)"
+            params = params + [sort_value, seq]
+
+        direction = "DESC" if descending else "ASC"
+        cursor_rows = conn.execute(
+            f"SELECT {sort_expression} AS sort_value, seq, {', '.join(ROW_COLUMNS)} FROM rows WHERE {where} "
+            f"ORDER BY sort_value {direction}, seq {direction} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(cursor_rows) == limit:
+            next_cursor = _encode_cursor(cursor_rows[-1]["sort_value"], cursor_rows[-1]["seq"])
+        rows = [{column: row[column] for column in ROW_COLUMNS} for row in cursor_rows]
+        return rows, total, next_cursor
+
+    def add_file(self, record, rows, folder_id=None):
+        with self._transaction() as conn:
+            self._insert_file(conn, record, rows, folder_id)
+
+    def add_files(self, entries, folder_id=None):
+        """Store several (record, rows) pairs in a single transaction."""
+        with self._transaction() as conn:
+            for record, rows in entries:
+                self._insert_file(conn, record, rows, folder_id)
+
+    def create_file(self, record, folder_id=None):
+        self.add_file(record, [], folder_id)
+
+    def append_rows(self, file_id, rows, start_seq):
+        """Add a batch of rows to an existing file and fold them into its totals."""
+        total_expense = sum(float(row.get("expense") or 0) for row in rows)
+        total_income = sum(float(row.get("income") or 0) for row in rows)
+        with self._transaction() as conn:
+            self._insert_rows(conn, file_id, rows, start_seq)
+            conn.execute(
+                "UPDATE files SET total_records = total_records + ?, total_expense = total_expense + ?, "
+                "total_income = total_income + ?, version = version + 1 WHERE id = ?",
+                (len(rows), total_expense, total_income, file_id),
+            )
+
+    def rename_file(self, file_id, new_name):
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE files SET filename = ? WHERE id = ?", (new_name, file_id))
+        return cursor.rowcount > 0
+
+    def move_file(self, file_id, folder_id):
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE files SET folder_id = ? WHERE id = ?", (folder_id, file_id))
+        return cursor.rowcount > 0
+
+    def delete_file(self, file_id):
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return cursor.rowcount > 0
+
+    def create_folder(self, record):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO folders (id, name, created_date) VALUES (?, ?, ?)",
+                (record["id"], record["name"], record["createdDate"]),
+            )
+
+    def get_folder(self, folder_id):
+        row = self._read().execute("SELECT * FROM folders WHERE id = ?", (folder_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find_folder_by_name(self, name):
+        row = self._read().execute("SELECT * FROM folders WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def delete_folder(self, folder_id):
+        # Files inside the folder (and their rows) go with it, as they did
+        # when folders held their files inline in uploaded_files.json
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+        return cursor.rowcount > 0
+
+    def summarize(self, file_id=None, folder_id=None, date_from=None, date_to=None):
+        """Return month/classification totals for a file, a folder or everything.
+
+        Whole months in the date range come straight from the aggregates
+        table; only the days at a partial month boundary touch rows.
+        """
+        if file_id is not None:
+            scope, params = "file_id = ?", [file_id]
+        elif folder_id is not None:
+            scope, params = "file_id IN (SELECT id FROM files WHERE folder_id = ?)", [folder_id]
+        else:
+            scope, params = "1", []
+
+        conn = self._read()
+        queries = []
+        if date_from or date_to:
+            first_month, last_month, partial_spans = _split_date_range(date_from, date_to)
+        else:
+            first_month, last_month, partial_spans = None, None, []
+
+        if not (date_from or date_to):
+            queries.append((
+                f"SELECT month, classification, TOTAL(expense), TOTAL(income), SUM(row_count) "
+                f"FROM aggregates WHERE {scope} GROUP BY 1, 2",
+                params,
+            ))
+        elif first_month is not None:
+            queries.append((
+                f"SELECT month, classification, TOTAL(expense), TOTAL(income), SUM(row_count) "
+                f"FROM aggregates WHERE {scope} AND month BETWEEN ? AND ? GROUP BY 1, 2",
+                params + [first_month, last_month],
+            ))
+        for span_start, span_end in partial_spans:
+            queries.append((
+                f"SELECT substr(date_iso, 1, 7), COALESCE(classification, ''), "
+                f"TOTAL(MAX(COALESCE(expense, 0), 0)), TOTAL(MAX(COALESCE(income, 0), 0)), COUNT(*) "
+                f"FROM rows WHERE {scope} AND date_iso BETWEEN ? AND ? GROUP BY 1, 2",
+                params + [span_start, span_end],
+            ))
+
+        totals = []
+        for sql, query_params in queries:
+            for month, classification, expense, income, count in conn.execute(sql, query_params):
+                totals.append({
+                    "month": month,
+                    "classification": classification,
+                    "expense": expense,
+                    "income": income,
+                    "count": count,
+                })
+        return totals
+
+    def reclassify_activity(self, activity, classify_row, prefix=False):
+        """Re-run classification on the stored rows for one activity.
+
+        Candidates come from the activity index: rows whose normalized
+        activity equals the given one, plus, with prefix=True, rows whose
+        activity starts with it as whole words. classify_row(row) returns
+        each row's classification under the current rules; rows where it
+        differs are updated along with their aggregates, and returned.
+        A returned row's idx is its seq, i.e. its position in the stored
+        statement, the same idx the upload endpoints report in rem_class.
+        """
+        key = normalize_activity(activity)
+        sql = f"SELECT id, file_id, seq, {', '.join(ROW_COLUMNS)} FROM rows WHERE activity_norm = ?"
+        params = [key]
+        if prefix:
+            # "!" sorts right after " ", so this range is every "<key> ..." value
+            sql += " OR (activity_norm >= ? AND activity_norm < ?)"
+            params += [key + " ", key + "!"]
+
+        changed = []
+        with self._transaction() as conn:
+            for row in conn.execute(sql, params).fetchall():
+                row = dict(row)
+                classification = classify_row(row)
+                if classification != row["classification"]:
+                    changed.append((row, classification))
+
+            rows_by_file = {}
+            for row, classification in changed:
+                old_rows, new_rows = rows_by_file.setdefault(row["file_id"], ([], []))
+                old_rows.append(row)
+                new_rows.append(dict(row, classification=classification))
+            conn.executemany(
+                "UPDATE rows SET classification = ? WHERE id = ?",
+                ((classification, row["id"]) for row, classification in changed),
+            )
+            for file_id, (old_rows, new_rows) in rows_by_file.items():
+                conn.execute("UPDATE files SET version = version + 1 WHERE id = ?", (file_id,))
+                _apply_aggregate_deltas(conn, file_id, _aggregate_deltas(old_rows, -1))
+                _apply_aggregate_deltas(conn, file_id, _aggregate_deltas(new_rows))
+
+        return [
+            {
+                "fileId": row["file_id"],
+                "idx": row["seq"],
+                **{column: row[column] for column in ROW_COLUMNS},
+                "classification": classification,
+                "previousClassification": row["classification"],
+            }
+            for row, classification in changed
+        ]
+
+    def search(self, text=None, classification=None, folder_id=None, date_from=None, date_to=None,
+               min_amount=None, max_amount=None, limit=50, offset=0):
+        """Find rows across every stored file.
+
+        Returns the newest matching rows (with their file's id, name and
+        folder), the total number of matches, and per-classification
+        facets. Facets ignore the classification filter so they can be
+        used to switch between classifications.
+        """
+        joins = "rows r JOIN files f ON f.id = r.file_id"
+        conditions = []
+        params = []
+        if text:
+            fts_query = _search_query(text)
+            if fts_query is None:
+                return {"results": [], "total": 0, "facets": []}
+            joins = "rows_search s JOIN rows r ON r.id = s.rowid JOIN files f ON f.id = r.file_id"
+            conditions.append("rows_search MATCH ?")
+            params.append(fts_query)
+        if folder_id is not None:
+            conditions.append("f.folder_id = ?")
+            params.append(folder_id)
+        if date_from is not None:
+            conditions.append("r.date_iso >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("r.date_iso <= ?")
+            params.append(date_to)
+        if min_amount is not None:
+            conditions.append("MAX(COALESCE(r.expense, 0), COALESCE(r.income, 0)) >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append("MAX(COALESCE(r.expense, 0), COALESCE(r.income, 0)) <= ?")
+            params.append(max_amount)
+
+        conn = self._read()
+        where = " AND ".join(conditions) or "1"
+        facets = [
+            {"classification": classification_, "count": count, "expense": expense, "income": income}
+            for classification_, count, expense, income in conn.execute(
+                f"SELECT COALESCE(r.classification, ''), COUNT(*), TOTAL(r.expense), TOTAL(r.income) "
+                f"FROM {joins} WHERE {where} GROUP BY 1 ORDER BY 2 DESC, 1",
+                params,
+            )
+        ]
+
+        if classification is not None:
+            where += " AND r.classification = ?"
+            params = params + [classification]
+            total = sum(facet["count"] for facet in facets if facet["classification"] == classification)
+        else:
+            total = sum(facet["count"] for facet in facets)
+
+        results = [
+            {
+                "fileId": row["file_id"],
+                "filename": row["filename"],
+                "folderId": row["folder_id"],
+                "idx": row["seq"],
+                **{column: row[column] for column in ROW_COLUMNS},
+            }
+            for row in conn.execute(
+                f"SELECT r.file_id, f.filename, f.folder_id, r.seq, "
+                f"{', '.join('r.' + column for column in ROW_COLUMNS)} FROM {joins} WHERE {where} "
+                f"ORDER BY r.date_iso DESC, r.id LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            )
+        ]
+        return {"results": results, "total": total, "facets": facets}
+
+    def import_legacy_json(self, path=LEGACY_STORAGE_FILE):
+        """Copy uploaded_files.json into the database once; later calls are no-ops."""
+        if not os.path.exists(path):
+            return 0
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+                return 0
+            with open(path, "r") as f:
+                items = json.load(f)
+
+            imported = 0
+            for item in items:
+                if item.get("type") == "folder":
+                    conn.execute(
+                        "INSERT OR IGNORE INTO folders (id, name, created_date) VALUES (?, ?, ?)",
+                        (item["id"], item["name"], item["createdDate"]),
+                    )
+                    for file in item.get("files", []):
+                        self._insert_file(conn, file, file.get("data", []), item["id"])
+                        imported += 1
+                else:
+                    self._insert_file(conn, item, item.get("data", []))
+                    imported += 1
+
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                (datetime.now().isoformat(),),
+            )
+        return imported
+
+
+STORAGE_BACKENDS = {
+    "sqlite": SQLiteStorage,
+}
+
+
+def open_storage(backend=None, **options):
+    """Create the configured backend and pull in any legacy JSON store."""
+    backend = backend or os.environ.get("EASYACCOUNTING_STORAGE", "sqlite")
+    storage = STORAGE_BACKENDS[backend](**options)
+    storage.import_legacy_json()
+    return storage
@@ -0,0 +1,54 @@
+from ingestion_module import deduplicate_statements
+
+
+def _row(date, activity, expense=0.0, income=0.0, total=0.0, classification="No classification"):
+    return {
+        "date": date,
+        "activity": activity,
+        "expense": expense,
+        "income": income,
+        "total": total,
+        "classification": classification,
+    }
+
+
+def _statement(filename, rows, unmatched=()):
+    return {"filename": filename, "rows": rows, "unmatched": list(unmatched)}
+
+
+def test_overlap_is_dropped_from_the_later_statement():
+    first = _statement("a.csv", [_row("10/30/2024", "RENT", 900.0), _row("10/31/2024", "COFFEE", 4.5)])
+    second = _statement("b.csv", [_row("10/31/2024", "COFFEE", 4.5), _row("11/01/2024", "BUS", 3.0)])
+    deduplicate_statements([first, second])
+    assert [row["activity"] for row in first["rows"]] == ["RENT", "COFFEE"]
+    assert [row["activity"] for row in second["rows"]] == ["BUS"]
+    assert (first["duplicatesRemoved"], second["duplicatesRemoved"]) == (0, 1)
+
+
+def test_dates_match_across_export_formats():
+    old = _statement("Oct2024accounts.csv", [_row("10/31/2024", "COFFEE   _V", 4.5, total=10.0)])
+    new = _statement("Nov2024accounts.csv", [_row("2024-10-31", "coffee _V", 4.5, total=10.0)])
+    deduplicate_statements([old, new])
+    assert new["rows"] == []
+    assert new["duplicatesRemoved"] == 1
+
+
+def test_repeats_are_kept_max_n_m_times():
+    coffee = _row("10/31/2024", "COFFEE", 4.5)
+    first = _statement("a.csv", [dict(coffee), dict(coffee)])
+    second = _statement("b.csv", [dict(coffee), dict(coffee), dict(coffee)])
+    third = _statement("c.csv", [dict(coffee)])
+    deduplicate_statements([first, second, third])
+    assert [len(result["rows"]) for result in (first, second, third)] == [2, 1, 0]
+
+
+def test_rem_class_idx_points_at_the_kept_rows():
+    first = _statement("a.csv", [_row("10/31/2024", "COFFEE", 4.5)])
+    second = _statement(
+        "b.csv",
+        [_row("10/31/2024", "COFFEE", 4.5), _row("11/01/2024", "BUS", 3.0), _row("11/02/2024", "BOOKS", 20.0)],
+        unmatched=[0, 2],
+    )
+    deduplicate_statements([first, second])
+    assert [(entry["idx"], entry["activity"]) for entry in second["rem_class"]] == [(1, "BOOKS")]
+    assert second["rows"][1]["activity"] == "BOOKS"
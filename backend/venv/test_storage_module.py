@@ -0,0 +1,37 @@
+from storage_module import _split_date_range
+
+
+def test_whole_months():
+    assert _split_date_range("2024-01-01", "2024-03-31") == ("2024-01", "2024-03", [])
+
+
+def test_partial_months_at_both_ends():
+    assert _split_date_range("2024-01-15", "2024-03-10") == (
+        "2024-02",
+        "2024-02",
+        [("2024-01-15", "2024-01-31"), ("2024-03-01", "2024-03-10")],
+    )
+
+
+def test_adjacent_partial_months_have_no_whole_month():
+    assert _split_date_range("2024-01-15", "2024-02-10") == (
+        None,
+        None,
+        [("2024-01-15", "2024-01-31"), ("2024-02-01", "2024-02-10")],
+    )
+
+
+def test_within_one_month():
+    assert _split_date_range("2024-02-03", "2024-02-20") == (None, None, [("2024-02-03", "2024-02-20")])
+    assert _split_date_range("2024-02-01", "2024-02-29") == ("2024-02", "2024-02", [])
+
+
+def test_open_ends():
+    assert _split_date_range("2024-02-01", None) == ("2024-02", "\uffff", [])
+    assert _split_date_range(None, "2023-12-31") == ("0000", "2023-12", [])
+    assert _split_date_range("2024-02-10", None) == ("2024-03", "\uffff", [("2024-02-10", "2024-02-29")])
+
+
+def test_inverted_range_matches_nothing():
+    assert _split_date_range("2024-02-15", "2024-01-10") == (None, None, [])
+    assert _split_date_range("2024-02-20", "2024-02-03") == (None, None, [])